@@ -10,11 +10,33 @@ class Config:
     # Model configuration
     MODEL_NAME = "pritamdeka/S-PubMedBert-MS-MARCO"
     CHUNK_SIZE = 500
+    EMBEDDING_BATCH_SIZE = 64  # Chunks per ClinicalBERT forward pass
+    EMBEDDING_CACHE_DIR = "vector_db/emb_cache"  # Per-chunk embeddings keyed by content hash; None disables
     CHUNK_OVERLAP = 50
+    USE_LANGCHAIN_SPLITTER = False  # Force the LangChain splitter even if semantic-text-splitter is installed
     TOP_K_RESULTS = 5
+    SEARCH_CACHE_SIZE = 1024  # Max cached hybrid_search results (LRU)
+    QUERY_EMBEDDING_CACHE_SIZE = 2048  # Max cached query embeddings (LRU)
+    
+    # PDF parsing configuration
+    PDF_SPLIT_MIN_PAGES = 50  # PDFs with at least this many pages are parsed in parallel ranges
+    PDF_PAGES_PER_SPLIT = 5  # Pages per parallel range
+    PIPELINE_QUEUE_SIZE = 4  # Items buffered between the parse, chunk and embed stages
     
     # FAISS configuration
+    FAISS_MMAP = True  # Memory-map indexes on load so IVF lists are paged in on demand
+    FAISS_USE_GPU = True  # Train/add IVF-PQ indexes on the GPU when faiss-gpu sees a device
     HNSW_M = 32  # Number of connections per layer in HNSW graph
+    HNSW_EF_CONSTRUCTION = 200  # Candidate list size while building the graph
+    HNSW_EF_SEARCH = 64  # Candidate list size at query time (recall vs. latency)
+    IVF_MIN_VECTORS = 10_000  # Collections larger than this use IVF-PQ instead of HNSW
+    IVF_NLIST = 100  # Number of inverted lists (coarse clusters)
+    IVF_NPROBE = 10  # Lists scanned per query
+    IVF_TRAIN_SIZE = 25_600  # Max vectors sampled to train the quantizers
+    # PQ sub-quantizers; must divide the embedding dimension. GPU IVF-PQ with inner product only
+    # supports 1/2/3/4/6/8/10/12/16/20/24/28/32 dims per sub-quantizer: 32 gives 24 for 768-d BERT
+    PQ_M = 32
+    PQ_NBITS = 8  # Bits per PQ sub-quantizer code
     
     @classmethod
     def ensure_directories(cls):
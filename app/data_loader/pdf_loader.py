@@ -1,22 +1,35 @@
 import json
 import logging
+import multiprocessing
+import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Optional, List, Dict, Union
+from typing import Iterator, Optional, List, Dict, Tuple, Union
 from enum import Enum
 
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
 from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
 from docling.datamodel.base_models import InputFormat
 from docling.datamodel.pipeline_options import (
     AcceleratorDevice,
     AcceleratorOptions,
     PdfPipelineOptions,
+    TableFormerMode,
 )
 from docling.document_converter import DocumentConverter, PdfFormatOption
 from docling.models.ocr_mac_model import OcrMacOptions
 from docling.models.tesseract_ocr_model import TesseractOcrOptions
 from docling.models.tesseract_ocr_cli_model import TesseractCliOcrOptions
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
 class OcrEngine(Enum):
     EASYOCR = "easyocr"
     TESSERACT = "tesseract"
@@ -27,25 +40,57 @@ class OcrEngine(Enum):
 class PdfParser:
     def __init__(
         self,
-        ocr_engine: OcrEngine = OcrEngine.EASYOCR,
+        ocr_engine: OcrEngine = OcrEngine.NONE,
         languages: List[str] = ["en"],
         use_gpu: bool = True,
         num_threads: int = 4,
-        do_table_structure: bool = True,
+        do_table_structure: bool = False,
         cell_matching: bool = True,
-        output_dir: str = "output"
+        output_dir: str = "output",
+        table_mode: str = "fast",
+        text_fallback: bool = False,
+        fast_mode: bool = False
     ):
+        """
+        Args:
+            table_mode: TableFormer mode, "fast" or "accurate"
+            text_fallback: Extract text directly with pypdfium2, bypassing Docling,
+                for text-only PDFs when only txt/md exports are requested
+            fast_mode: Shortcut that disables OCR and table structure, uses the
+                fast table mode and enables text_fallback
+        """
         self.logger = logging.getLogger(__name__)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
+        if fast_mode:
+            ocr_engine = OcrEngine.NONE
+            do_table_structure = False
+            table_mode = "fast"
+            text_fallback = True
+        self.text_fallback = text_fallback
+        
+        # Kept so worker processes can build an identically configured parser
+        self._init_kwargs = {
+            "ocr_engine": ocr_engine,
+            "languages": languages,
+            "use_gpu": use_gpu,
+            "num_threads": num_threads,
+            "do_table_structure": do_table_structure,
+            "cell_matching": cell_matching,
+            "output_dir": output_dir,
+            "table_mode": table_mode,
+            "text_fallback": text_fallback,
+        }
+        
         self.pipeline_options = self._configure_pipeline(
             ocr_engine,
             languages,
             use_gpu,
             num_threads,
             do_table_structure,
-            cell_matching
+            cell_matching,
+            table_mode
         )
         
         self.doc_converter = DocumentConverter(
@@ -64,7 +109,8 @@ class PdfParser:
         use_gpu: bool,
         num_threads: int,
         do_table_structure: bool,
-        cell_matching: bool
+        cell_matching: bool,
+        table_mode: str
     ) -> PdfPipelineOptions:
         pipeline_options = PdfPipelineOptions()
         
@@ -85,6 +131,7 @@ class PdfParser:
         pipeline_options.do_table_structure = do_table_structure
         if do_table_structure:
             pipeline_options.table_structure_options.do_cell_matching = cell_matching
+            pipeline_options.table_structure_options.mode = TableFormerMode(table_mode)
         
         # Configure acceleration settings
         pipeline_options.accelerator_options = AcceleratorOptions(
@@ -97,7 +144,8 @@ class PdfParser:
     def parse_pdf(
         self,
         input_path: Union[str, Path],
-        export_formats: List[str] = ["json", "txt", "md", "doctags"]
+        export_formats: List[str] = ["json", "txt", "md", "doctags"],
+        page_range: Optional[Tuple[int, int]] = None
     ) -> Dict:
         """
         Parse PDF and export in specified formats.
@@ -105,6 +153,8 @@ class PdfParser:
         Args:
             input_path: Path to input PDF file
             export_formats: List of export formats (json, txt, md, doctags)
+            page_range: Optional (first, last) 1-based inclusive page range to parse;
+                exports are then suffixed with _p<first>-<last>
             
         Returns:
             Dictionary containing parsing metadata and export paths
@@ -113,15 +163,23 @@ class PdfParser:
         if not input_path.exists():
             raise FileNotFoundError(f"Input file not found: {input_path}")
 
+        if (
+            self.text_fallback
+            and set(export_formats) <= {"txt", "md"}
+            and self._is_text_pdf(input_path)
+        ):
+            return self._parse_text_pdf(input_path, export_formats, page_range)
+
         # Convert document
         start_time = time.time()
-        conv_result = self.doc_converter.convert(input_path)
+        convert_kwargs = {"page_range": page_range} if page_range else {}
+        conv_result = self.doc_converter.convert(input_path, **convert_kwargs)
         processing_time = time.time() - start_time
         
         self.logger.info(f"Document converted in {processing_time:.2f} seconds.")
 
         # Export results
-        doc_filename = conv_result.input.file.stem
+        doc_filename = self._export_name(conv_result.input.file.stem, page_range)
         export_paths = {}
         
         export_methods = {
@@ -136,12 +194,11 @@ class PdfParser:
                 export_func, extension = export_methods[format_name]
                 output_path = self.output_dir / f"{doc_filename}.{extension}"
                 
-                with output_path.open("w", encoding="utf-8") as fp:
-                    content = export_func()
-                    if isinstance(content, dict):
-                        json.dump(content, fp, ensure_ascii=False, indent=2)
-                    else:
-                        fp.write(content)
+                content = export_func()
+                if isinstance(content, dict):
+                    self._write_json(output_path, content)
+                else:
+                    output_path.write_text(content, encoding="utf-8")
                         
                 export_paths[format_name] = str(output_path)
 
@@ -152,4 +209,174 @@ class PdfParser:
             "ocr_enabled": self.pipeline_options.do_ocr,
             "table_structure_enabled": self.pipeline_options.do_table_structure,
             "content": content,
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def _write_json(output_path: Path, content: Dict) -> None:
+        """Write the JSON export compactly, using orjson when it is installed."""
+        if orjson is not None:
+            output_path.write_bytes(orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with output_path.open("w", encoding="utf-8") as fp:
+                json.dump(content, fp, ensure_ascii=False)
+
+    def parse_pdfs(
+        self,
+        input_paths: List[Union[str, Path]],
+        export_formats: List[str] = ["json", "txt", "md", "doctags"],
+        num_workers: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Parse several PDFs in parallel, one document per worker process.
+        
+        Each worker builds its own parser with num_threads=1, so documents run
+        side by side instead of contending for Docling's intra-document threads.
+        
+        Args:
+            input_paths: Paths to input PDF files
+            export_formats: List of export formats (json, txt, md, doctags)
+            num_workers: Number of worker processes (defaults to a quarter of the CPUs)
+            
+        Returns:
+            List of parse_pdf results, in the same order as input_paths
+        """
+        with self._worker_pool(num_workers) as executor:
+            return list(executor.map(_parse_in_worker, input_paths, repeat(export_formats)))
+
+    def parse_page_ranges(
+        self,
+        input_path: Union[str, Path],
+        page_ranges: List[Tuple[int, int]],
+        export_formats: List[str] = ["md"],
+        num_workers: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Parse page ranges of one PDF in parallel worker processes.
+        
+        Workers are configured as in parse_pdfs. At most two ranges per worker
+        are in flight ahead of the consumer, so a slow consumer throttles parsing
+        instead of letting finished ranges pile up in memory.
+        
+        Args:
+            input_path: Path to input PDF file
+            page_ranges: (first, last) 1-based inclusive page ranges
+            export_formats: List of export formats (json, txt, md, doctags)
+            num_workers: Number of worker processes (defaults to a quarter of the CPUs)
+            
+        Yields:
+            parse_pdf results, in the same order as page_ranges
+        """
+        num_workers = num_workers or default_num_workers()
+        with self._worker_pool(num_workers) as executor:
+            pending = deque()
+            try:
+                for page_range in page_ranges:
+                    pending.append(executor.submit(_parse_in_worker, input_path, export_formats, page_range))
+                    if len(pending) >= 2 * num_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # A consumer that stops early (generator close) shouldn't wait on unstarted ranges
+                for future in pending:
+                    future.cancel()
+
+    def _worker_pool(self, num_workers: Optional[int]) -> ProcessPoolExecutor:
+        """Process pool of single-threaded parser workers, shared by parse_pdfs and parse_page_ranges."""
+        worker_kwargs = {**self._init_kwargs, "num_threads": 1}
+        return ProcessPoolExecutor(
+            max_workers=num_workers or default_num_workers(),
+            # Pools are created from pipeline threads and after CUDA is initialised;
+            # forking then can deadlock the child or break CUDA in it
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(worker_kwargs,)
+        )
+
+    @staticmethod
+    def count_pages(input_path: Union[str, Path]) -> int:
+        """Number of pages in a PDF, read with pypdfium2 without parsing any content."""
+        pdf = pdfium.PdfDocument(input_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    @staticmethod
+    def _export_name(stem: str, page_range: Optional[Tuple[int, int]]) -> str:
+        if page_range is None:
+            return stem
+        return f"{stem}_p{page_range[0]}-{page_range[1]}"
+
+    @staticmethod
+    def _is_text_pdf(input_path: Path, max_image_coverage: float = 0.05) -> bool:
+        """Sample the first page: it must carry a text layer and be less than 5% images."""
+        pdf = pdfium.PdfDocument(input_path)
+        try:
+            if len(pdf) == 0:
+                return False
+            page = pdf[0]
+            width, height = page.get_size()
+            image_area = 0.0
+            for obj in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_IMAGE,)):
+                left, bottom, right, top = obj.get_pos()
+                image_area += (right - left) * (top - bottom)
+            has_text = page.get_textpage().count_chars() > 0
+            return has_text and image_area / (width * height) < max_image_coverage
+        finally:
+            pdf.close()
+
+    def _parse_text_pdf(
+        self,
+        input_path: Path,
+        export_formats: List[str],
+        page_range: Optional[Tuple[int, int]] = None
+    ) -> Dict:
+        """Extract the text layer with pypdfium2 directly, skipping Docling's layout models."""
+        start_time = time.time()
+        pdf = pdfium.PdfDocument(input_path)
+        try:
+            first, last = page_range if page_range else (1, len(pdf))
+            content = "\n\n".join(
+                pdf[i].get_textpage().get_text_range() for i in range(first - 1, min(last, len(pdf)))
+            )
+        finally:
+            pdf.close()
+        processing_time = time.time() - start_time
+        
+        self.logger.info(f"Text layer extracted in {processing_time:.2f} seconds.")
+
+        doc_filename = self._export_name(input_path.stem, page_range)
+        export_paths = {}
+        for format_name in export_formats:
+            output_path = self.output_dir / f"{doc_filename}.{format_name}"
+            output_path.write_text(content, encoding="utf-8")
+            export_paths[format_name] = str(output_path)
+
+        return {
+            "processing_time": processing_time,
+            "export_paths": export_paths,
+            "document_name": doc_filename,
+            "ocr_enabled": False,
+            "table_structure_enabled": False,
+            "content": content,
+        }
+
+
+# Per-process parser used by PdfParser.parse_pdfs and parse_page_ranges workers
+_worker_parser: Optional[PdfParser] = None
+
+def default_num_workers() -> int:
+    """Default size of parser process pools: a quarter of the CPUs."""
+    return max(1, (os.cpu_count() or 1) // 4)
+
+def _init_worker(parser_kwargs: Dict) -> None:
+    global _worker_parser
+    _worker_parser = PdfParser(**parser_kwargs)
+
+def _parse_in_worker(
+    input_path: Union[str, Path],
+    export_formats: List[str],
+    page_range: Optional[Tuple[int, int]] = None
+) -> Dict:
+    return _worker_parser.parse_pdf(input_path, export_formats, page_range)
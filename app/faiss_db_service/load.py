@@ -1,5 +1,20 @@
+import os
 import faiss
 import numpy as np
 
-def load_faiss_index(faiss_index_path: str):
-    return faiss.read_index(f"vector_db/{faiss_index_path}")
+def load_faiss_index(faiss_index_path: str, mmap: bool = True):
+    """
+    Load an index from vector_db/. With mmap, FAISS pages the IVF inverted lists
+    in from disk on demand instead of reading the whole file into RAM; HNSW and
+    flat indexes are small enough that FAISS still reads them fully.
+    """
+    # Let FAISS's OpenMP distance kernels use every core
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+    io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(f"vector_db/{faiss_index_path}", io_flags)
+
+    # IVF indexes: parallelize over queries and probed lists
+    if hasattr(index, "parallel_mode"):
+        index.parallel_mode = 1
+    return index
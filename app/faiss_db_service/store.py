@@ -2,16 +2,66 @@ import os
 import json
 import numpy as np
 import faiss
+from app.config.config import Config
+from app.utils.util import bm25_tokenize
 
-def store_in_faiss(faiss_index_path: str, clinical_bert_embeddings, texts):
-    print("Processing texts and storing embeddings in FAISS index...")
+def _use_gpu() -> bool:
+    """True when faiss-gpu is installed, enabled in Config and sees at least one device."""
+    return Config.FAISS_USE_GPU and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
 
-    # Convert text chunks into embeddings
-    embeddings = np.vstack([clinical_bert_embeddings(text) for text in texts]).astype(np.float32)
+def _new_ivfpq(dim: int):
+    quantizer = faiss.IndexFlatIP(dim)
+    return faiss.IndexIVFPQ(
+        quantizer, dim, Config.IVF_NLIST, Config.PQ_M, Config.PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+    )
 
-    # Create FAISS index
-    index = faiss.IndexFlatL2(embeddings.shape[1])
+def _build_ivfpq_on_gpu(train_vectors: np.ndarray, embeddings: np.ndarray):
+    """Train and fill an IVF-PQ index on GPU 0 and return its CPU copy for write_index."""
+    gpu_resources = faiss.StandardGpuResources()
+    index = faiss.index_cpu_to_gpu(gpu_resources, 0, _new_ivfpq(embeddings.shape[1]))
+    index.train(train_vectors)
     index.add(embeddings)
+    return faiss.index_gpu_to_cpu(index)
+
+def store_in_faiss(faiss_index_path: str, embeddings: np.ndarray, texts):
+    """
+    Index precomputed (N, d) embeddings for texts and save the index, texts and BM25 tokens.
+    Embeddings are normalized in place.
+    """
+    print("Storing embeddings in FAISS index...")
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+    # FAISS needs a C-contiguous float32 matrix; this is a no-op for batched_encode output
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    # Unit-normalize so inner product equals cosine similarity
+    faiss.normalize_L2(embeddings)
+
+    # Create FAISS index: IVF-PQ for large collections, HNSW otherwise
+    dim = embeddings.shape[1]
+    if len(embeddings) > Config.IVF_MIN_VECTORS:
+        # Train the coarse quantizer and PQ codebooks on a random sample
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(embeddings), size=min(len(embeddings), Config.IVF_TRAIN_SIZE), replace=False)
+        train_vectors = embeddings[np.sort(sample)]
+
+        # k-means training and PQ encoding dominate build time and run far faster on GPU
+        index = None
+        if _use_gpu():
+            try:
+                index = _build_ivfpq_on_gpu(train_vectors, embeddings)
+            except RuntimeError as exc:  # e.g. PQ settings the GPU kernels don't support
+                print(f"GPU IVF-PQ build failed ({exc}); training on CPU instead")
+        if index is None:
+            index = _new_ivfpq(dim)
+            index.train(train_vectors)
+            index.add(embeddings)
+        index.nprobe = Config.IVF_NPROBE
+    else:
+        # GPU FAISS has no HNSW; small collections build quickly on CPU anyway
+        index = faiss.IndexHNSWFlat(dim, Config.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = Config.HNSW_EF_CONSTRUCTION
+        index.add(embeddings)
 
     # Save FAISS index
     os.makedirs("vector_db", exist_ok=True)
@@ -22,4 +72,9 @@ def store_in_faiss(faiss_index_path: str, clinical_bert_embeddings, texts):
     with open(text_store_path, "w", encoding="utf-8") as f:
         json.dump(texts, f, indent=4)
 
+    # Cache BM25 tokens so the search engine doesn't re-tokenize on every start
+    tokens_path = f"vector_db/{faiss_index_path}.tokens.json"
+    with open(tokens_path, "w", encoding="utf-8") as f:
+        json.dump([bm25_tokenize(text) for text in texts], f)
+
     print(f"Stored {len(texts)} documents in FAISS and saved texts in {text_store_path}")
@@ -1,18 +1,44 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.config.config import Config
 import re
 
+try:
+    from semantic_text_splitter import MarkdownSplitter
+except ImportError:  # Rust-backed splitter is optional; fall back to LangChain
+    MarkdownSplitter = None
+
+# Patterns are compiled once at import; the two Docling placeholders share one pass
+_PLACEHOLDERS = re.compile(r"<!-- (?:missing-text|image) -->")
+# One lowercase letter is enough context: same split points as ([a-z]+), without
+# rescanning every lowercase run from each of its positions
+_CAMEL = re.compile(r'([a-z])([A-Z])')
+_DUP = re.compile(r'\b(\w+)\1+\b')
+_SINGLE_CHAR = re.compile(r'\b[a-zA-Z]\b')
+
 def text_preprocessor(text):
-    text = re.sub(r"<!-- missing-text -->", "", text)
-    text = re.sub(r"<!-- image -->", "", text)
-    text = re.sub(r'([a-z]+)([A-Z])', r'\1 \2', text)
-    text = re.sub(r'\b(\w+)\1+\b', r'\1', text)
-    text = re.sub(r'\b[a-zA-Z]\b', '', text)
+    if "<!--" in text:  # Substring check is far cheaper than a regex pass on clean text
+        text = _PLACEHOLDERS.sub("", text)
+    text = _CAMEL.sub(r'\1 \2', text)
+    text = _DUP.sub(r'\1', text)
+    text = _SINGLE_CHAR.sub('', text)
     text = text.replace("/n/n","/n")
     return text
 
 # Step 2: Use RecursiveCharacterTextSplitter with Markdown-friendly Separators
 text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,
-    chunk_overlap=50,
+    chunk_size=Config.CHUNK_SIZE,
+    chunk_overlap=Config.CHUNK_OVERLAP,
     separators=["\n# ", "\n## ", "\n### ", "\n- ", "\n\n"]  # Preserve Markdown structure
 )
+
+# Rust-backed Markdown splitter, preferred over the pure-Python one when installed
+markdown_splitter = (
+    MarkdownSplitter(Config.CHUNK_SIZE, overlap=Config.CHUNK_OVERLAP)
+    if MarkdownSplitter is not None and not Config.USE_LANGCHAIN_SPLITTER
+    else None
+)
+
+def split_text(text):
+    if markdown_splitter is not None:
+        return markdown_splitter.chunks(text)
+    return text_splitter.split_text(text)
@@ -2,47 +2,93 @@ import numpy as np
 import faiss
 from rank_bm25 import BM25Okapi
 from typing import List, Dict, Tuple, Optional
-import nltk
-from nltk.tokenize import word_tokenize
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from app.word_embeddings.bert_med_embedding import get_clinical_bert_embeddings
+from app.config.config import Config
+from app.faiss_db_service.load import load_faiss_index
+from app.utils.util import bm25_tokenize
+import os
 import json
 import logging
+import functools
+from collections import OrderedDict
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+try:
+    import numba
+except ImportError:  # numba is optional; fall back to in-place NumPy ops
+    numba = None
+
+# Logging is configured by the entry point; importing this module must not force DEBUG on
+logger = logging.getLogger(__name__)
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _combine_scores(bm25, semantic, tfidf, w_bm25, w_semantic, w_tfidf, out):
+        """Weighted sum of the three score vectors in one fused loop."""
+        for i in numba.prange(out.shape[0]):
+            out[i] = w_bm25 * bm25[i] + w_semantic * semantic[i] + w_tfidf * tfidf[i]
+else:
+    def _combine_scores(bm25, semantic, tfidf, w_bm25, w_semantic, w_tfidf, out):
+        """Weighted sum of the three score vectors, accumulated in place."""
+        np.multiply(bm25, w_bm25, out=out)
+        out += w_semantic * semantic
+        out += w_tfidf * tfidf
+
+@functools.lru_cache(maxsize=Config.QUERY_EMBEDDING_CACHE_SIZE)
+def _embed_query(query: str) -> np.ndarray:
+    """
+    Unit-normalized (1, d) query embedding, cached so repeated queries skip the
+    BERT forward pass. The returned array is shared; don't modify it in place.
+    """
+    query_embedding = get_clinical_bert_embeddings([query])
+    faiss.normalize_L2(query_embedding)
+    return query_embedding
 
 class EnhancedSearchEngine:
     def __init__(self, faiss_index_path: str):
         """
         Initialize the enhanced search engine with FAISS, BM25, and TF-IDF.
         """
-        logging.info("Initializing Enhanced Search Engine...")
-        nltk.download('punkt', quiet=True)
+        logger.info("Initializing Enhanced Search Engine...")
         
         # Load FAISS index
         faiss_index_file = f"vector_db/{faiss_index_path}.index"
-        self.faiss_index = faiss.read_index(faiss_index_file)
-        logging.info(f"Loaded FAISS index from {faiss_index_file}")
+        self.faiss_index = load_faiss_index(f"{faiss_index_path}.index", mmap=Config.FAISS_MMAP)
+        # Scores below are read as cosine similarities; L2 indexes from older stores return distances
+        if self.faiss_index.metric_type != faiss.METRIC_INNER_PRODUCT:
+            raise ValueError(
+                f"{faiss_index_file} is not an inner-product index; rebuild it with store_in_faiss"
+            )
+        if hasattr(self.faiss_index, "hnsw"):
+            self.faiss_index.hnsw.efSearch = Config.HNSW_EF_SEARCH
+        if hasattr(self.faiss_index, "nprobe"):
+            self.faiss_index.nprobe = Config.IVF_NPROBE
+        logger.info(f"Loaded FAISS index from {faiss_index_file}")
 
         # Load stored documents (fixed incorrect file extension)
         text_store_path = f"vector_db/{faiss_index_path}.json"
         with open(text_store_path, "r", encoding="utf-8") as f:
             self.documents = json.load(f)
-        logging.info(f"Loaded {len(self.documents)} documents from {text_store_path}")
+        logger.info(f"Loaded {len(self.documents)} documents from {text_store_path}")
 
-        # Tokenize documents for BM25
-        tokenized_docs = [word_tokenize(doc) for doc in self.documents]
+        # Load BM25 tokens cached by store_in_faiss, tokenizing only for older stores
+        tokens_path = f"vector_db/{faiss_index_path}.tokens.json"
+        if os.path.exists(tokens_path):
+            with open(tokens_path, "r", encoding="utf-8") as f:
+                tokenized_docs = json.load(f)
+        else:
+            tokenized_docs = [bm25_tokenize(doc) for doc in self.documents]
         self.bm25 = BM25Okapi(tokenized_docs)
 
         # Fit TF-IDF vectorizer
-        self.tfidf = TfidfVectorizer(ngram_range=(1, 3), max_features=10000, norm='l2')
+        # float32 halves the matrix's memory and matches the other score vectors
+        self.tfidf = TfidfVectorizer(ngram_range=(1, 3), max_features=10000, norm='l2', dtype=np.float32)
         self.tfidf_matrix = self.tfidf.fit_transform(self.documents)
 
-        # Cache for repeated queries
-        self.doc_cache = {}
-        logging.info("Search engine initialized successfully.")
+        # LRU cache for repeated queries, bounded so long-running services don't grow without limit
+        self.result_cache: OrderedDict = OrderedDict()
+        self.result_cache_size = Config.SEARCH_CACHE_SIZE
+        logger.info("Search engine initialized successfully.")
 
     def hybrid_search(self, query: str, top_k: int = 5,
                       weights: Optional[Dict[str, float]] = None) -> List[Tuple[str, float]]:
@@ -50,55 +96,78 @@ class EnhancedSearchEngine:
         Perform a hybrid search using FAISS, BM25, and TF-IDF to retrieve relevant documents.
         Returns top_k retrieved document texts along with their scores.
         """
-        logging.debug(f"Performing hybrid search for query: '{query}'")
-        
         if weights is None:
             weights = {'bm25': 0.3, 'semantic': 0.4, 'tfidf': 0.3}
         
-        cache_key = f"{query}_{top_k}"
-        if cache_key in self.doc_cache:
-            logging.debug("Returning cached search results.")
-            return self.doc_cache[cache_key]
+        query = query.strip()
+        cache_key = (query.lower(), top_k, tuple(sorted(weights.items())))
+        if cache_key in self.result_cache:
+            logger.debug("Returning cached search results.")
+            self.result_cache.move_to_end(cache_key)
+            return self.result_cache[cache_key]
+
+        results = self._hybrid_search_impl(query, top_k, weights)
+
+        self.result_cache[cache_key] = results
+        if len(self.result_cache) > self.result_cache_size:
+            self.result_cache.popitem(last=False)
+        return results
+
+    def _hybrid_search_impl(self, query: str, top_k: int,
+                            weights: Dict[str, float]) -> List[Tuple[str, float]]:
+        """
+        Score every document with BM25, FAISS and TF-IDF and return the top_k combined results.
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Performing hybrid search for query: '%s'", query)
 
         # ------------------- 1. BM25 Search -------------------
-        tokenized_query = word_tokenize(query)
+        tokenized_query = bm25_tokenize(query)
         bm25_scores = np.array(self.bm25.get_scores(tokenized_query))
         bm25_scores = self.normalize_scores(bm25_scores)
-        logging.debug(f"BM25 scores (normalized): {bm25_scores[:5]}")
+        if debug:
+            logger.debug("BM25 scores (normalized): %s", bm25_scores[:5])
 
         # ------------------- 2. Semantic Search (FAISS) -------------------
-        query_embedding = get_clinical_bert_embeddings(query).reshape(1, -1)
+        query_embedding = _embed_query(query)
         D, I = self.faiss_index.search(query_embedding, top_k)
-        logging.debug(f"FAISS search results - Distances: {D}, Indices: {I}")
+        if debug:
+            logger.debug("FAISS search results - Similarities: %s, Indices: %s", D, I)
 
-        # Normalize FAISS distances into scores
-        semantic_scores = np.zeros(len(self.documents))
-        if len(I) > 0 and I.shape[1] > 0:
-            max_D = np.max(D[0]) + 1e-10  # Avoid division by zero
-            for i, idx in enumerate(I[0]):
-                if 0 <= idx < len(semantic_scores):
-                    semantic_scores[idx] = 1 - (D[0][i] / max_D)
-        logging.debug(f"Semantic scores (normalized): {semantic_scores[:5]}")
+        # Inner product of unit vectors is cosine similarity; clip negatives to 0.
+        # FAISS pads missing neighbours with -1, so drop those before scattering
+        semantic_scores = np.zeros(len(self.documents), dtype=np.float32)
+        valid = I[0] >= 0
+        semantic_scores[I[0][valid]] = np.maximum(D[0][valid], 0.0)
+        if debug:
+            logger.debug("Semantic scores (normalized): %s", semantic_scores[:5])
 
         # ------------------- 3. TF-IDF Search -------------------
+        # Rows are already L2-normalized (norm='l2'), so cosine similarity is a sparse mat-vec
         query_tfidf = self.tfidf.transform([query])
-        tfidf_scores = cosine_similarity(query_tfidf, self.tfidf_matrix)[0]
-        logging.debug(f"TF-IDF scores (normalized): {tfidf_scores[:5]}")
+        tfidf_scores = np.asarray(self.tfidf_matrix @ query_tfidf.T.toarray()).ravel()
+        if debug:
+            logger.debug("TF-IDF scores (normalized): %s", tfidf_scores[:5])
 
         # ------------------- 4. Combine Scores -------------------
-        final_scores = (
-            weights['bm25'] * bm25_scores +
-            weights['semantic'] * semantic_scores +
-            weights['tfidf'] * tfidf_scores
+        final_scores = np.empty(len(self.documents), dtype=np.float32)
+        _combine_scores(
+            bm25_scores, semantic_scores, tfidf_scores,
+            weights['bm25'], weights['semantic'], weights['tfidf'],
+            final_scores
         )
 
-        # Get top-k results
-        top_indices = np.argsort(final_scores)[::-1][:top_k]
+        # Get top-k results: O(N) partition, then sort only the k winners
+        k = min(top_k, len(final_scores))
+        if k < len(final_scores):
+            top_indices = np.argpartition(-final_scores, k)[:k]
+        else:
+            top_indices = np.arange(len(final_scores))
+        top_indices = top_indices[np.argsort(-final_scores[top_indices])]
         results = [(self.documents[idx], float(final_scores[idx])) for idx in top_indices]
-        logging.debug(f"Final retrieved document texts and scores: {results}")
-
-        # Cache results for faster future queries
-        self.doc_cache[cache_key] = results
+        if debug:
+            logger.debug("Final retrieved document texts and scores: %s", results)
         return results
 
     @staticmethod
@@ -106,8 +175,9 @@ class EnhancedSearchEngine:
         """
         Normalize scores between 0 and 1.
         """
-        if np.all(scores == 0):
-            return scores
-        normalized_scores = (scores - np.min(scores)) / (np.max(scores) - np.min(scores))
-        logging.debug(f"Normalized scores: {normalized_scores[:5]}")
+        normalized_scores = scores.astype(np.float32, copy=True)
+        normalized_scores -= normalized_scores.min()
+        max_score = normalized_scores.max()
+        if max_score:
+            normalized_scores /= max_score
         return normalized_scores
@@ -1,16 +1,23 @@
 from transformers import (
     AutoTokenizer, 
-    AutoModelForSeq2SeqGeneration,
     pipeline,
     BartForConditionalGeneration
 )
 import re
+import torch
 from typing import List, Dict, Union, Optional
 import numpy as np
 from nltk.tokenize import sent_tokenize
 import nltk
 from collections import defaultdict
 
+# Download necessary NLTK data once per process, and only if it is missing
+# NLTK 3.9+ sent_tokenize loads punkt_tab rather than the pickled punkt models
+try:
+    nltk.data.find('tokenizers/punkt_tab')
+except LookupError:
+    nltk.download('punkt_tab', quiet=True)
+
 class MedicalReportSummarizer:
     def __init__(
         self,
@@ -30,18 +37,22 @@ class MedicalReportSummarizer:
             min_length: Minimum length of the summary
             use_medical_preprocessing: Whether to use medical-specific preprocessing
         """
-        # Download necessary NLTK data
-        nltk.download('punkt', quiet=True)
-        
-        # Initialize models and tokenizers
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = BartForConditionalGeneration.from_pretrained(model_name)
+        # Initialize models and tokenizers, in half precision on GPU
+        use_cuda = torch.cuda.is_available()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        if not self.tokenizer.is_fast:
+            raise ValueError(f"No fast (Rust) tokenizer available for {model_name}")
+        self.model = BartForConditionalGeneration.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16 if use_cuda else None
+        )
         
-        # Initialize medical-specific pipeline
+        # Initialize medical-specific pipeline around the already-loaded model and tokenizer
         self.medical_summarizer = pipeline(
             "summarization",
-            model=model_name,
-            tokenizer=model_name
+            model=self.model,
+            tokenizer=self.tokenizer,
+            device=0 if use_cuda else -1
         )
         
         self.max_length = max_length
@@ -50,9 +61,9 @@ class MedicalReportSummarizer:
         
         # Medical terminology patterns
         self.medical_patterns = {
-            'measurements': r'\d+\.?\d*\s*(mg|ml|g|kg|mm|cm|mcg)',
-            'lab_values': r'\d+\.?\d*\s*(WBC|RBC|HGB|HCT|MCV|PLT)',
-            'vital_signs': r'(BP|HR|RR|SpO2|Temp):?\s*\d+\.?\d*',
+            'measurements': r'\d+\.?\d*\s*(?:mg|ml|g|kg|mm|cm|mcg)',
+            'lab_values': r'\d+\.?\d*\s*(?:WBC|RBC|HGB|HCT|MCV|PLT)',
+            'vital_signs': r'(?:BP|HR|RR|SpO2|Temp):?\s*\d+\.?\d*',
             'dates': r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}'
         }
         
@@ -63,6 +74,28 @@ class MedicalReportSummarizer:
             'assessment': ['assessment', 'impression', 'diagnosis'],
             'plan': ['plan', 'treatment plan', 'recommendations']
         }
+        
+        # All medical patterns fused into one named-group alternation, so the
+        # text is scanned once and each match is dispatched by match.lastgroup
+        self._medical_re = re.compile(
+            '|'.join(f'(?P<{name}>{pattern})' for name, pattern in self.medical_patterns.items()),
+            re.IGNORECASE
+        )
+        
+        # All section headers in one alternation, longest first so
+        # 'treatment plan:' wins over 'plan:'
+        self._header_to_section = {
+            header: section_type
+            for section_type, headers in self.section_headers.items()
+            for header in headers
+        }
+        self._header_re = re.compile(
+            '(' + '|'.join(
+                re.escape(header)
+                for header in sorted(self._header_to_section, key=len, reverse=True)
+            ) + '):',
+            re.IGNORECASE
+        )
 
     def preprocess_medical_text(self, text: str) -> str:
         """
@@ -79,17 +112,12 @@ class MedicalReportSummarizer:
         text = re.sub(r'\n+', '\n', text)
         
         # Standardize section headers
-        for section_type, headers in self.section_headers.items():
-            for header in headers:
-                pattern = re.compile(f'{header}:', re.IGNORECASE)
-                text = pattern.sub(f'\n{section_type.upper()}:', text)
+        text = self._header_re.sub(
+            lambda m: f'\n{self._header_to_section[m.group(1).lower()].upper()}:', text
+        )
         
         # Preserve important medical patterns
-        for pattern_name, pattern in self.medical_patterns.items():
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                value = match.group(0)
-                text = text.replace(value, f' {value} ')
+        text = self._medical_re.sub(lambda m: f' {m.group(0)} ', text)
         
         # Remove redundant whitespace
         text = ' '.join(text.split())
@@ -147,34 +175,7 @@ class MedicalReportSummarizer:
         else:
             processed_text = text
         
-        # Extract sections
-        sections = self.extract_key_sections(processed_text)
-        
-        # Generate main summary
-        main_summary = self.medical_summarizer(
-            processed_text,
-            max_length=self.max_length,
-            min_length=self.min_length,
-            do_sample=False
-        )[0]['summary_text']
-        
-        result = {
-            'main_summary': main_summary,
-            'sections': {},
-            'key_findings': self.extract_key_findings(processed_text)
-        }
-        
-        # Generate section-wise summaries if requested
-        if include_sections:
-            for section, content in sections.items():
-                if content.strip():
-                    section_summary = self.medical_summarizer(
-                        content,
-                        max_length=self.max_length // 2,
-                        min_length=self.min_length // 2,
-                        do_sample=False
-                    )[0]['summary_text']
-                    result['sections'][section] = section_summary
+        result = self._summarize_processed([processed_text], include_sections)[0]
         
         # Focus on specific areas if requested
         if focus_areas:
@@ -184,6 +185,105 @@ class MedicalReportSummarizer:
         
         return result
 
+    def _summarize_processed(
+        self,
+        processed_texts: List[str],
+        include_sections: bool = True,
+        batch_size: Optional[int] = None
+    ) -> List[Dict[str, Union[str, Dict[str, str]]]]:
+        """
+        Summarize preprocessed reports with one batched pipeline call for the
+        main summaries and one for all section summaries.
+        
+        Args:
+            processed_texts: Preprocessed medical report texts
+            include_sections: Whether to include section-wise summaries
+            batch_size: Pipeline batch size (defaults to all texts at once)
+            
+        Returns:
+            List of summaries for each report
+        """
+        main_summaries = self._run_summarizer(
+            processed_texts, self.max_length, self.min_length, batch_size
+        )
+        results = [
+            {
+                'main_summary': main_summary,
+                'sections': {},
+                'key_findings': self.extract_key_findings(processed_text)
+            }
+            for main_summary, processed_text in zip(main_summaries, processed_texts)
+        ]
+        
+        if include_sections:
+            # (report index, section name, content) for every non-empty section
+            section_items = [
+                (report_idx, section, content)
+                for report_idx, processed_text in enumerate(processed_texts)
+                for section, content in self.extract_key_sections(processed_text).items()
+                if content.strip()
+            ]
+            section_summaries = self._run_summarizer(
+                [content for _, _, content in section_items],
+                self.max_length // 2,
+                self.min_length // 2,
+                batch_size
+            )
+            for (report_idx, section, _), section_summary in zip(section_items, section_summaries):
+                results[report_idx]['sections'][section] = section_summary
+        
+        return results
+
+    def _run_summarizer(
+        self,
+        texts: List[str],
+        max_length: int,
+        min_length: int,
+        batch_size: Optional[int] = None
+    ) -> List[str]:
+        """
+        Run the summarization pipeline over a list of texts.
+        
+        When the texts span several batches they are sorted by token length and
+        split into length quartiles, so each batch pads to similar lengths.
+        Shorter buckets get proportionally larger batches, capped at four times
+        batch_size. Summaries are returned in the caller's order.
+        """
+        if not texts:
+            return []
+        if batch_size is None or len(texts) <= batch_size:
+            outputs = self.medical_summarizer(
+                texts,
+                max_length=max_length,
+                min_length=min_length,
+                do_sample=False,
+                batch_size=len(texts)
+            )
+            return [output['summary_text'] for output in outputs]
+        
+        token_ids = self.tokenizer(texts, add_special_tokens=False)['input_ids']
+        lengths = np.array([min(len(ids), self.tokenizer.model_max_length) for ids in token_ids])
+        order = np.argsort(lengths, kind='stable')
+        longest = max(int(lengths[order[-1]]), 1)
+        
+        summaries = [None] * len(texts)
+        for bucket in np.array_split(order, 4):
+            if len(bucket) == 0:
+                continue
+            bucket_longest = max(int(lengths[bucket[-1]]), 1)
+            outputs = self.medical_summarizer(
+                [texts[i] for i in bucket],
+                max_length=max_length,
+                min_length=min_length,
+                do_sample=False,
+                # Decoder/KV-cache memory grows with max_length output tokens, not input
+                # length, so short inputs can't scale the batch without bound
+                batch_size=max(1, min(batch_size * longest // bucket_longest, 4 * batch_size))
+            )
+            for i, output in zip(bucket, outputs):
+                summaries[i] = output['summary_text']
+        return summaries
+
     def extract_key_findings(self, text: str) -> Dict[str, List[str]]:
         """
         Extract key medical findings from the text.
@@ -202,9 +302,8 @@ class MedicalReportSummarizer:
         }
         
         # Extract findings using medical patterns
-        for category, pattern in self.medical_patterns.items():
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            findings[category] = [match.group(0) for match in matches]
+        for match in self._medical_re.finditer(text):
+            findings[match.lastgroup].append(match.group(0))
         
         return findings
 
@@ -260,11 +359,9 @@ class MedicalReportSummarizer:
         Returns:
             List of summaries for each report
         """
-        summaries = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_summaries = [self.summarize(text) for text in batch]
-            summaries.extend(batch_summaries)
+        if self.use_medical_preprocessing:
+            processed_texts = [self.preprocess_medical_text(text) for text in texts]
+        else:
+            processed_texts = list(texts)
         
-        return summaries
\ No newline at end of file
+        return self._summarize_processed(processed_texts, batch_size=batch_size)
\ No newline at end of file
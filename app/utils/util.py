@@ -1,8 +1,15 @@
 # File: src/utils.py
 from typing import List, Dict
 import json
+import re
 from pathlib import Path
 
+_WORD = re.compile(r"\w+")
+
+def bm25_tokenize(text: str) -> List[str]:
+    """Lowercased word tokens for BM25; cheaper than NLTK and needs no Punkt model."""
+    return _WORD.findall(text.lower())
+
 def save_metadata(file_name: str, chunks: List[str], save_dir: Path):
     """Save document chunks metadata."""
     metadata = {
@@ -12,4 +19,4 @@ def save_metadata(file_name: str, chunks: List[str], save_dir: Path):
     
     metadata_path = save_dir / f"{file_name}_metadata.json"
     with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
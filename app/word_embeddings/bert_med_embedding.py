@@ -1,19 +1,158 @@
+import sys
+import threading
+import warnings
+from pathlib import Path
+from typing import List
+
+import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModel
 
-# Load the Clinical BERT model and tokenizer
+# Clinical BERT model configuration
 model_name = "medicalai/ClinicalBERT"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name)
+use_bf16 = False  # Prefer bfloat16 over float16 on GPUs that support it (Ampere+)
+use_onnx = False  # Run through ONNX Runtime instead of eager PyTorch (needs optimum[onnxruntime])
+onnx_quantize = True  # INT8 dynamic quantization of the exported model (CPU only)
+use_torch_compile = sys.platform != "win32"  # CUDA only; torch.compile needs Triton, which has no Windows build
+onnx_dir = Path("onnx_models") / model_name.replace("/", "_")
+max_length = 512  # Tokens per text; longer texts are truncated
+pooling_version = 1  # Bump when _encode's pooling changes so cached embeddings are invalidated
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# Function to get embeddings from Clinical BERT
-def get_clinical_bert_embeddings(text):
-    # Tokenize the input text
-    inputs = tokenizer(text, return_tensors='pt', padding=True, truncation=True, max_length=512)
+# Process-wide singletons, loaded on first use by get_model()
+tokenizer = None
+model = None
+dtype = None
+_model_lock = threading.Lock()
+
+
+def _load_onnx_model():
+    """Export the model to ONNX once, then load it as an optimized ONNX Runtime session."""
+    import onnxruntime as ort
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    quantize = onnx_quantize and device.type == "cpu"
+    file_name = "model_quantized.onnx" if quantize else "model.onnx"
+
+    if not (onnx_dir / file_name).exists():
+        ort_model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        ort_model.save_pretrained(onnx_dir)
+        if quantize:
+            quantizer = ORTQuantizer.from_pretrained(onnx_dir, file_name="model.onnx")
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=onnx_dir, quantization_config=qconfig)
+
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    provider = "CUDAExecutionProvider" if device.type == "cuda" else "CPUExecutionProvider"
+    return ORTModelForFeatureExtraction.from_pretrained(
+        onnx_dir,
+        file_name=file_name,
+        provider=provider,
+        session_options=session_options,
+        use_io_binding=device.type == "cuda",  # Bind outputs on the GPU instead of copying through host memory
+    )
+
+
+def get_model():
+    """Load the tokenizer and model once per process; later calls reuse them."""
+    global tokenizer, model, dtype
+    if model is None:
+        with _model_lock:
+            if model is None:
+                loaded_tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+                if not loaded_tokenizer.is_fast:
+                    raise ValueError(f"No fast (Rust) tokenizer available for {model_name}")
+                if use_onnx:
+                    loaded_model = _load_onnx_model()
+                    loaded_dtype = torch.float32
+                else:
+                    # Run in half precision on GPU; CPU stays in FP32. Loading straight into
+                    # the target dtype avoids materializing a full FP32 copy first
+                    if device.type == "cuda":
+                        loaded_dtype = torch.bfloat16 if use_bf16 and torch.cuda.is_bf16_supported() else torch.float16
+                    else:
+                        loaded_dtype = torch.float32
+                    loaded_model = AutoModel.from_pretrained(model_name, torch_dtype=loaded_dtype).to(device)
+                    loaded_model.eval()
+                    if use_torch_compile and device.type == "cuda" and hasattr(torch, "compile"):
+                        # Fuses LayerNorm/GELU/attention epilogues. Padding to a multiple of 8
+                        # still leaves up to 64 sequence lengths times every batch size seen
+                        # (including (1, L) queries), so expect recompiles while shapes warm up
+                        loaded_model = torch.compile(loaded_model, mode="reduce-overhead", fullgraph=False)
+                tokenizer, dtype = loaded_tokenizer, loaded_dtype
+                model = loaded_model
+    return tokenizer, model
+
+def embedding_signature() -> str:
+    """
+    Identifies everything that changes the embedding values: the model, backend,
+    dtype, pooling and truncation length. Loads the model to resolve the dtype.
+    """
+    get_model()
+    if use_onnx:
+        backend = "onnx-int8" if onnx_quantize and device.type == "cpu" else "onnx"
+    else:
+        backend = "torch"
+    return f"{model_name}|{backend}|{dtype}|pool-v{pooling_version}|{max_length}"
+
+def _forward(inputs):
+    """Run the model, dropping back to eager mode for good if torch.compile fails."""
+    global model
+    use_autocast = device.type == "cuda" and not use_onnx
+    with torch.inference_mode(), torch.autocast(device_type=device.type, dtype=dtype, enabled=use_autocast):
+        try:
+            return model(**inputs)
+        except Exception as exc:
+            eager_model = getattr(model, "_orig_mod", None)
+            if eager_model is None:
+                raise
+            warnings.warn(f"torch.compile failed ({exc!r}); falling back to the eager model")
+            model = eager_model
+            return model(**inputs)
+
+def _encode(inputs) -> np.ndarray:
+    """Forward one tokenized, padded batch and mean-pool it into FP32 embeddings."""
+    inputs = {key: val.to(device) for key, val in inputs.items()}
 
     # Get the model outputs
-    with torch.no_grad():
-        outputs = model(**inputs)
-    embeddings = outputs.last_hidden_state.mean(dim=1)  # Extract meaningful embeddings
-    print("Embeddings shape:", embeddings.shape)
-    return embeddings
\ No newline at end of file
+    outputs = _forward(inputs)
+
+    # Masked mean pooling so padding tokens don't dilute shorter texts.
+    # Pool in FP32: FAISS only accepts FP32 and the sum over 512 tokens can lose precision in FP16
+    hidden = outputs.last_hidden_state.float()
+    mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+    summed = (hidden * mask).sum(dim=1)
+    embeddings = summed / mask.sum(dim=1).clamp(min=1e-9)
+    return embeddings.cpu().numpy()
+
+# Function to get embeddings from Clinical BERT
+def get_clinical_bert_embeddings(texts: List[str]) -> np.ndarray:
+    tokenizer, _ = get_model()
+
+    # Tokenize the whole batch at once, padded to the longest text
+    return _encode(tokenizer(
+        texts, return_tensors='pt', padding=True, truncation=True, max_length=max_length, pad_to_multiple_of=8
+    ))
+
+def batched_encode(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Embed a large list of texts into an (N, hidden_size) float32 matrix.
+
+    Texts are tokenized once, then batched in order of token length ("smart
+    batching") so each batch pads only to its own longest text. Rows are
+    returned in the original order.
+    """
+    tokenizer, model = get_model()
+    embeddings = np.empty((len(texts), model.config.hidden_size), dtype=np.float32)
+    if not texts:
+        return embeddings
+
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    order = np.argsort([len(ids) for ids in encodings["input_ids"]], kind="stable")
+    for start in range(0, len(texts), batch_size):
+        batch_idx = order[start:start + batch_size]
+        features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch_idx]
+        embeddings[batch_idx] = _encode(tokenizer.pad(features, return_tensors='pt', pad_to_multiple_of=8))
+    return embeddings
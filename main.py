@@ -1,97 +1,306 @@
+import functools
+import hashlib
 import logging
+import multiprocessing
+import os
+import queue
+import threading
 import time
-from app.data_loader.pdf_loader import PdfParser, OcrEngine
-from app.pre_processor.markdown_preprocess import text_splitter,text_preprocessor
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice, repeat
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+import numpy as np
+from app.config.config import Config
+from app.data_loader.pdf_loader import PdfParser, OcrEngine, default_num_workers
+from app.pre_processor.markdown_preprocess import split_text,text_preprocessor
 from app.rag.enhanced_search_engine import EnhancedSearchEngine
-from app.word_embeddings.bert_med_embedding import get_clinical_bert_embeddings
+from app.word_embeddings.bert_med_embedding import batched_encode, embedding_signature
 from app.faiss_db_service.store import store_in_faiss
 
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
+def _get_parser(output_dir: str, num_threads: int = 4) -> PdfParser:
+    """
+    Creates and configures a PdfParser instance, once per process and output directory.
+    """
+    logger.info("Setting up PDF parser...")
+    return PdfParser(
+        ocr_engine=OcrEngine.NONE,  # Disables OCR since text extraction is direct
+        languages=["en"],  # Specifies English as the primary language
+        use_gpu=True,  # Enables GPU acceleration for performance improvement
+        num_threads=num_threads,  # Sets the number of CPU threads for parallel processing
+        do_table_structure=True,  # Enables table structure recognition
+        cell_matching=True,  # Improves accuracy in structured documents
+        output_dir=output_dir  # Specifies directory to store parsed files
+    )
+
+def _embedding_cache_path(signature: str, text: str) -> Path:
+    """
+    Cache file for one chunk's embedding, keyed by the embedding signature and the chunk text.
+    """
+    digest = hashlib.sha256(f"{signature}\0{text}".encode("utf-8")).hexdigest()
+    return Path(Config.EMBEDDING_CACHE_DIR) / f"{digest}.npy"
+
+def _encode_cached(texts: List[str]) -> np.ndarray:
+    """
+    Embeds texts, reusing embeddings cached on disk and encoding only the misses.
+    """
+    if not Config.EMBEDDING_CACHE_DIR or not texts:
+        return batched_encode(texts, batch_size=Config.EMBEDDING_BATCH_SIZE)
+
+    signature = embedding_signature()
+    paths = [_embedding_cache_path(signature, text) for text in texts]
+    rows = [np.load(path, mmap_mode="r") if path.exists() else None for path in paths]
+    misses = [i for i, row in enumerate(rows) if row is None]
+    if misses:
+        encoded = batched_encode([texts[i] for i in misses], batch_size=Config.EMBEDDING_BATCH_SIZE)
+        os.makedirs(Config.EMBEDDING_CACHE_DIR, exist_ok=True)
+        for i, row in zip(misses, encoded):
+            # Write then rename, so concurrent pipelines never read a half-written file
+            tmp_path = paths[i].with_suffix(f".{os.getpid()}.tmp.npy")
+            np.save(tmp_path, row)
+            os.replace(tmp_path, paths[i])
+            rows[i] = row
+    logger.debug("Embedding cache: %d hits, %d misses", len(texts) - len(misses), len(misses))
+    return np.stack(rows)
+
+# Marks the end of a stage's output on its queue
+_END = object()
+# How often blocked stages wake up to check whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Puts item on the queue, giving up once stop is set. Returns whether it was put.
+    """
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _feed(items: Iterable, out: queue.Queue, stop: threading.Event) -> None:
+    """
+    Thread target: puts every item on the queue, then _END, or the exception that stopped it.
+    Returns early once stop is set.
+    """
+    try:
+        for item in items:
+            if not _put(out, item, stop):
+                return
+        _put(out, _END, stop)
+    except BaseException as exc:
+        _put(out, exc, stop)
+
+def _drain(q: queue.Queue, stop: threading.Event) -> Iterator:
+    """
+    Yields items from a queue filled by _feed until _END or stop, re-raising a failed stage's exception.
+    """
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+def _batched(items: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Groups items into lists of Config.EMBEDDING_BATCH_SIZE.
+    """
+    items = iter(items)
+    while batch := list(islice(items, Config.EMBEDDING_BATCH_SIZE)):
+        yield batch
+
+def _run_pipeline_worker(pdf_path: str, output_dir: str):
+    """
+    Worker entry point: runs the full pipeline for one PDF, indexed under the file's stem.
+    """
+    PDFProcessingPipeline(
+        pdf_path=pdf_path,
+        output_dir=output_dir,
+        faiss_index_path=Path(pdf_path).stem,
+        split_pages=False,  # Already parallel across files; don't nest process pools
+        parser_threads=1  # One Docling thread per worker, as in PdfParser.parse_pdfs
+    ).run_pipeline()
+
 class PDFProcessingPipeline:
-    def __init__(self, pdf_path: str, output_dir: str = "parsed_pdfs", faiss_index_path: str = "vector_db"):
+    def __init__(self, pdf_path: str, output_dir: str = "parsed_pdfs", faiss_index_path: str = "vector_db",
+                 split_pages: bool = True, max_workers: Optional[int] = None, parser_threads: int = 4):
         """
         Initializes the PDF processing pipeline with given file path and configurations.
+        
+        Large PDFs (Config.PDF_SPLIT_MIN_PAGES pages or more) are parsed in
+        Config.PDF_PAGES_PER_SPLIT-page ranges across max_workers processes
+        (a quarter of the CPUs by default) when split_pages is enabled.
+        parser_threads sets Docling's CPU threads for unsplit parses.
         """
-        logging.info("Initializing PDFProcessingPipeline...")
+        logger.info("Initializing PDFProcessingPipeline...")
         self.pdf_path = pdf_path
         self.output_dir = output_dir
         self.faiss_index_path = faiss_index_path
-        self.parser = self._initialize_parser()
-        logging.info("Initialization complete.")
-        
-    def _initialize_parser(self) -> PdfParser:
-        """
-        Creates and configures a PdfParser instance.
-        """
-        logging.info("Setting up PDF parser...")
-        return PdfParser(
-            ocr_engine=OcrEngine.NONE,  # Disables OCR since text extraction is direct
-            languages=["en"],  # Specifies English as the primary language
-            use_gpu=True,  # Enables GPU acceleration for performance improvement
-            num_threads=4,  # Sets the number of CPU threads for parallel processing
-            do_table_structure=True,  # Enables table structure recognition
-            cell_matching=True,  # Improves accuracy in structured documents
-            output_dir=self.output_dir  # Specifies directory to store parsed files
-        )
+        self.split_pages = split_pages
+        self.max_workers = max_workers
+        self.parser = _get_parser(self.output_dir, parser_threads)  # Docling models load once per process
+        logger.info("Initialization complete.")
     
     def parse_pdf(self):
         """
         Parses the PDF and extracts content as markdown.
         """
-        logging.info("Starting PDF parsing...")
+        return "\n\n".join(self.iter_markdown())
+    
+    def iter_markdown(self) -> Iterator[str]:
+        """
+        Parses the PDF and yields its markdown: one piece per page range for split
+        PDFs, otherwise the whole document at once.
+        """
+        logger.info("Starting PDF parsing...")
+        if self.split_pages:
+            num_pages = PdfParser.count_pages(self.pdf_path)
+            if num_pages >= Config.PDF_SPLIT_MIN_PAGES:
+                yield from self._parse_pdf_split(num_pages)
+                return
+        
         result = self.parser.parse_pdf(input_path=self.pdf_path, export_formats=["md"])
-        logging.info(f"Parsing completed in {result['processing_time']:.2f} seconds")
-        logging.info(f"Exported files: {result['export_paths']}")
-        logging.debug(f"Parsed content preview: {result['content'][:500]}")  # Logs preview of parsed text
-        return result["content"]
+        logger.info(f"Parsing completed in {result['processing_time']:.2f} seconds")
+        logger.info(f"Exported files: {result['export_paths']}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed content preview: %s", result['content'][:500])  # Logs preview of parsed text
+        yield result["content"]
+    
+    def _parse_pdf_split(self, num_pages: int) -> Iterator[str]:
+        """
+        Parses page ranges in worker processes, yielding their markdown in page order.
+        """
+        step = Config.PDF_PAGES_PER_SPLIT
+        page_ranges = [(first, min(first + step - 1, num_pages)) for first in range(1, num_pages + 1, step)]
+        logger.info(f"Splitting {num_pages} pages into {len(page_ranges)} ranges")
+        
+        start_time = time.time()
+        for result in self.parser.parse_page_ranges(
+            self.pdf_path, page_ranges, export_formats=["md"], num_workers=self.max_workers
+        ):
+            yield result["content"]
+        logger.info(f"Parsing completed in {time.time() - start_time:.2f} seconds")
     
-    def process_text(self, text: str):
+    def process_text(self, text: str) -> Iterator[str]:
         """
-        Splits extracted text into manageable chunks for embedding processing.
+        Splits extracted text into manageable chunks for embedding processing,
+        yielding them one at a time.
         """
-        logging.info("Text process before splitting...")
+        logger.info("Text process before splitting...")
         text = text_preprocessor(text)
-        logging.info("Splitting text into chunks...")
-        text_chunks = text_splitter.split_text(text)
-        logging.info(f"Total chunks created: {len(text_chunks)}")
-        logging.debug(f"First chunk preview: {text_chunks[0] if text_chunks else 'No chunks generated'}")
-        return text_chunks
+        logger.info("Splitting text into chunks...")
+        yield from split_text(text)
     
-    def store_embeddings(self, texts_chunks):
+    def _chunk_batches(self, pieces: Iterable[str]) -> Iterator[List[str]]:
+        """
+        Preprocesses and splits each markdown piece, yielding embedding-sized batches of chunks.
+        """
+        yield from _batched(chain.from_iterable(self.process_text(piece) for piece in pieces))
+    
+    def store_embeddings(self, texts_chunks: Iterable[str]):
         """
         Converts text chunks into embeddings and stores them in FAISS vector database.
+        Chunks are consumed from the iterable in embedding-sized batches; chunks
+        embedded on an earlier run are read from the on-disk cache.
+        """
+        self._store_embedding_batches(_batched(texts_chunks))
+    
+    def _store_embedding_batches(self, chunk_batches: Iterable[List[str]]):
         """
-        logging.info("Generating embeddings and storing in FAISS...")
+        store_embeddings for chunks that are already batched, as _chunk_batches yields them.
+        """
+        logger.info("Generating embeddings and storing in FAISS...")
+        texts_chunks, embedding_batches = [], []
+        for batch in chunk_batches:
+            texts_chunks.extend(batch)
+            embedding_batches.append(_encode_cached(batch))
+        logger.info(f"Total chunks created: {len(texts_chunks)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("First chunk preview: %s", texts_chunks[0] if texts_chunks else 'No chunks generated')
+        
+        embeddings = np.concatenate(embedding_batches) if embedding_batches else batched_encode([])
         store_in_faiss(
             faiss_index_path=self.faiss_index_path,
-            clinical_bert_embeddings=get_clinical_bert_embeddings,
+            embeddings=embeddings,
             texts=texts_chunks
         )
-        logging.info("FAISS storage completed.")
+        logger.info("FAISS storage completed.")
     
     def run_pipeline(self):
         """
         Executes the full PDF processing pipeline: parsing, text processing, and embedding storage.
         """
         start_time = time.time()
-        logging.info("Pipeline execution started.")
+        logger.info("Pipeline execution started.")
         
-        parsed_text = self.parse_pdf()
-        text_chunks = self.process_text(parsed_text)
-        self.store_embeddings(text_chunks)
+        # Parse and chunk on background threads so embedding starts on the first page
+        # range while later ones are still being parsed. Bounded queues, plus
+        # parse_page_ranges' bounded submissions, cap how far the CPU stages run ahead
+        markdown_queue = queue.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+        chunk_queue = queue.Queue(maxsize=Config.PIPELINE_QUEUE_SIZE)
+        stop = threading.Event()
+        markdown = self.iter_markdown()
+        chunk_batches = self._chunk_batches(_drain(markdown_queue, stop))
+        stages = [
+            threading.Thread(target=_feed, args=(markdown, markdown_queue, stop),
+                             name="pdf-parser", daemon=True),
+            threading.Thread(target=_feed, args=(chunk_batches, chunk_queue, stop),
+                             name="chunker", daemon=True),
+        ]
+        try:
+            for stage in stages:
+                stage.start()
+            self._store_embedding_batches(_drain(chunk_queue, stop))
+        finally:
+            # On failure, unblock the other stages and shut down the parser's worker pool
+            stop.set()
+            for stage in stages:
+                if stage.ident is not None:  # Started
+                    stage.join()
+            for q in (markdown_queue, chunk_queue):
+                while not q.empty():
+                    q.get_nowait()
+            chunk_batches.close()
+            markdown.close()
         
         end_time = time.time()
         total_time = end_time - start_time
-        logging.info(f"Pipeline execution completed in {total_time:.2f} seconds.")
-        logging.info("Pipeline finished successfully.")
+        logger.info(f"Pipeline execution completed in {total_time:.2f} seconds.")
+        logger.info("Pipeline finished successfully.")
+    
+    @classmethod
+    def run_pipeline_batch(cls, pdf_paths: List[str], output_dir: str = "parsed_pdfs",
+                           max_workers: Optional[int] = None):
+        """
+        Runs the pipeline for many PDFs in parallel, one file per worker process
+        (a quarter of the CPUs by default). Each PDF is indexed under its file name stem.
+        """
+        start_time = time.time()
+        with ProcessPoolExecutor(
+            max_workers=max_workers or default_num_workers(),
+            mp_context=multiprocessing.get_context("spawn")  # Workers init CUDA themselves; never fork it
+        ) as executor:
+            list(executor.map(_run_pipeline_worker, pdf_paths, repeat(output_dir)))
+        logger.info(f"Batch of {len(pdf_paths)} PDFs completed in {time.time() - start_time:.2f} seconds.")
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG)  # Sets logging level to debug for detailed logs
-    logging.info("Starting main execution...")
+    logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")  # Sets logging level to debug for detailed logs
+    logger.info("Starting main execution...")
     pdf_processor = PDFProcessingPipeline(
         pdf_path=r"C:\Users\harsh\OneDrive\Desktop\Rize\Rogi-Sahyogi\app\test_pdf\PEREZ_PEDRO_DA_RECORDS.pdf",faiss_index_path="PEREZ_PEDRO_DA_RECORDS"
     )
     pdf_processor.run_pipeline()
-    logging.info("Main execution completed.")
+    logger.info("Main execution completed.")
     
     search_engine = EnhancedSearchEngine(faiss_index_path="PEREZ_PEDRO_DA_RECORDS")
 
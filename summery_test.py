@@ -1,48 +1,136 @@
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 class MedicalSummarizer:
-    def __init__(self, model_name="Falconsai/medical_summarization", max_input_tokens=2048):
-        """Initialize the model and tokenizer."""
+    def __init__(self, model_name="Falconsai/medical_summarization", max_input_tokens=2048, batch_size=4, max_summary_tokens=None, use_onnx=False):
+        """
+        Initialize the model and tokenizer. With use_onnx the model runs through ONNX Runtime.
+        max_summary_tokens defaults to the model's generation config length, as generate() used before.
+        """
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        if not self.tokenizer.is_fast:
+            raise ValueError(f"No fast (Rust) tokenizer available for {model_name}")
         self.max_input_tokens = max_input_tokens
+        self.batch_size = batch_size
         
-        if self.device == "cuda":
-            self.model.half()  # Optimize for GPU
+        if use_onnx:
+            self.model = self._load_onnx_model(model_name)
+        else:
+            self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(self.device)
+            if self.device == "cuda":
+                self.model.half()  # Optimize for GPU
+        
+        if max_summary_tokens is None:
+            generation_config = self.model.generation_config
+            max_summary_tokens = generation_config.max_new_tokens or generation_config.max_length
+        self.max_summary_tokens = max_summary_tokens
+    
+    def _load_onnx_model(self, model_name):
+        """Export the seq2seq model to ONNX once, then load it with full graph optimizations."""
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        
+        onnx_dir = Path("onnx_models") / model_name.replace("/", "_")
+        if not (onnx_dir / "encoder_model.onnx").exists():
+            ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True).save_pretrained(onnx_dir)
+        
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        on_gpu = self.device == "cuda"
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            onnx_dir,
+            provider="CUDAExecutionProvider" if on_gpu else "CPUExecutionProvider",
+            session_options=session_options,
+            use_io_binding=on_gpu  # Keep tensors on the GPU between decoder steps
+        )
     
     def summarize_batch(self, chunks):
         """Summarizes text in batches for efficiency."""
         inputs = self.tokenizer(chunks, return_tensors="pt", padding=True, truncation=True, max_length=self.max_input_tokens)
-        inputs = {key: val.to(self.device) for key, val in inputs.items()}
+        return self._generate(self._pin(inputs))
+    
+    def _pin(self, inputs):
+        """Pins host tensors on GPU runs so the copy in _generate can be asynchronous."""
+        if self.device == "cuda":
+            return {key: val.pin_memory() for key, val in inputs.items()}
+        return dict(inputs)
+    
+    def _generate(self, inputs):
+        """Generates and decodes summaries for an already tokenized, padded batch."""
+        inputs = {key: val.to(self.device, non_blocking=True) for key, val in inputs.items()}
         
         with torch.no_grad():
             summary_ids = self.model.generate(
                 inputs["input_ids"],
-                num_beams=5,  # Increased beams for better summaries
-                length_penalty=1.5,
+                attention_mask=inputs["attention_mask"],
+                num_beams=1,  # Greedy decoding: beam search cost ~5x the decoder compute for marginal gains
+                do_sample=False,
                 repetition_penalty=1.2,
-                early_stopping=True
+                max_new_tokens=self.max_summary_tokens,
+                use_cache=True
             )
         
         return self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
     
-    def hierarchical_summarization(self, text):
-        """Performs hierarchical summarization using LLM-enhanced final summarization."""
+    def summarize_chunks(self, chunks):
+        """Summarizes deduplicated chunks in length-sorted batches to minimize padding."""
+        unique_chunks = list(dict.fromkeys(chunks))  # Drop exact duplicates, keep first-seen order
+        if not unique_chunks:
+            return []
+        
+        # Tokenize everything once; each batch is then only padded, never re-tokenized
+        encodings = self.tokenizer(unique_chunks, truncation=True, max_length=self.max_input_tokens)
+        order = np.argsort([len(ids) for ids in encodings["input_ids"]], kind="stable")
+        
+        batches = [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+        
+        def prepare(batch_idx):
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch_idx]
+            return self._pin(self.tokenizer.pad(features, return_tensors="pt"))
+        
+        # Pad and pin the next batch on a background thread while the current one generates
+        summaries = [None] * len(unique_chunks)
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            next_inputs = prefetcher.submit(prepare, batches[0])
+            for n, batch_idx in enumerate(batches):
+                inputs = next_inputs.result()
+                if n + 1 < len(batches):
+                    next_inputs = prefetcher.submit(prepare, batches[n + 1])
+                batch_summaries = self._generate(inputs)
+                for i, summary in zip(batch_idx, batch_summaries):
+                    summaries[i] = summary
+        return summaries
+    
+    def hierarchical_summarization(self, text, group_size=4):
+        """
+        Performs hierarchical map-reduce summarization: chunks are summarized, then
+        groups of group_size summaries are summarized again until one remains.
+        """
         print(f"Processing {len(text)} chunks...")  
-        sub_summaries = self.summarize_batch(text)
+        sub_summaries = self.summarize_chunks(text)
         
-        final_prompt = (
-            "Summarize the following medical and work status reports in a professional and concise manner, "
-            "ensuring clarity while retaining key details such as patient information, diagnosis, treatment, "
-            "work restrictions, medical evaluations, legal aspects, and overall status. Keep it clear, structured, "
-            "and easily understandable:\n" + "\n".join(sub_summaries)
-        )
-        print(final_prompt)
-        # final_summary = self.summarize_batch([final_prompt])[0]
-        # return final_summary
+        # A single sub-summary is already the final summary
+        if len(sub_summaries) <= 1:
+            return sub_summaries[0] if sub_summaries else ""
+        
+        # Skip the final pass when the combined sub-summaries already fit in one summary's budget
+        joined = "\n".join(sub_summaries)
+        if len(self.tokenizer.encode(joined)) <= self.max_summary_tokens:
+            return joined
+        
+        # Tree reduction: each level's inputs are bounded by group_size summaries, so nothing
+        # is truncated at max_input_tokens, and every level runs as one batched pass
+        while len(sub_summaries) > 1:
+            print(f"Reducing {len(sub_summaries)} summaries...")
+            sub_summaries = self.summarize_chunks([
+                "\n".join(sub_summaries[i:i + group_size]) for i in range(0, len(sub_summaries), group_size)
+            ])
+        return sub_summaries[0]
 
 # Example usage
 if __name__ == "__main__":